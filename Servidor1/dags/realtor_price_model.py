@@ -1,17 +1,29 @@
 import os
+import sys
+import json
 import datetime
 import requests
 import pandas as pd
 import numpy as np
 from sqlalchemy import create_engine, text, inspect
+from sqlalchemy.dialects import mysql
 from sqlalchemy.exc import ProgrammingError
-from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.linear_model import Ridge, Lasso, ElasticNet
+from sklearn.ensemble import HistGradientBoostingRegressor
 from sklearn.metrics import mean_squared_error
-from sklearn.model_selection import GridSearchCV
+from joblib import Parallel, delayed, parallel_backend
+from joblib.externals import cloudpickle
 import mlflow
 import mlflow.sklearn
+from mlflow.entities import Metric, Param
 from mlflow.tracking import MlflowClient
+from prometheus_client import CollectorRegistry, Gauge, push_to_gateway
+import math
+import time
+import functools
+import resource
 import logging
+import psutil
 
 from airflow import DAG
 from airflow.operators.python import PythonOperator, BranchPythonOperator
@@ -35,6 +47,313 @@ with DAG(
 ) as dag:
 
 
+    # ──────────────────────────────────────────────────────────────────────────────
+    # Perfilado por tarea: cada python_callable se envuelve con _traced(), que
+    # mide duración total, tramos (prof.lap), filas de entrada/salida, pico de
+    # RSS y bytes leídos/escritos por el proceso y, aparte (pool_*), por sus
+    # procesos hijos muestreados con prof.sample_children() (p.ej. el pool loky
+    # de la búsqueda de modelos). El perfil:
+    #   - se publica en XCom (key="profile");
+    #   - se empuja al Pushgateway de Servidor3 si AIRFLOW_VAR_PUSHGATEWAY_URL existe;
+    #   - train_and_register lo registra como métricas pipeline.* en su run de MLflow.
+    # ──────────────────────────────────────────────────────────────────────────────
+    PIPELINE_JOB = "realtor_price_model"
+
+    class TaskProfile:
+        def __init__(self, task_id):
+            self.task_id       = task_id
+            self.spans         = {}
+            self.rows_in       = 0
+            self.rows_out      = 0
+            self.mlflow_run_id = None
+            self._start        = time.perf_counter()
+            self._last         = self._start
+            self._pool         = {}
+            self._io_start     = self._io(psutil.Process())
+
+        @staticmethod
+        def _io(proc):
+            # read_chars/write_chars (Linux) incluyen sockets: HTTP, MySQL y MinIO
+            try:
+                io = proc.io_counters()
+            except (AttributeError, psutil.Error):
+                return None
+            return (getattr(io, "read_chars", io.read_bytes), getattr(io, "write_chars", io.write_bytes))
+
+        @staticmethod
+        def _peak_rss(proc):
+            # VmHWM es el pico de RSS del proceso (Linux); si no, el RSS actual
+            try:
+                with open(f"/proc/{proc.pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmHWM:"):
+                            return int(line.split()[1]) * 1024
+            except OSError:
+                pass
+            return proc.memory_info().rss
+
+        def sample_children(self):
+            """
+            Registra pico de RSS e I/O acumulado de los hijos vivos. Los workers
+            loky se reutilizan y siguen vivos tras la búsqueda, así que basta con
+            muestrear justo después; por pid se conserva el último valor.
+            """
+            for child in psutil.Process().children(recursive=True):
+                try:
+                    io = self._io(child)
+                    self._pool[child.pid] = (self._peak_rss(child), *(io or (0, 0)))
+                except psutil.Error:
+                    continue
+
+        def lap(self, name):
+            """Acumula en `name` el tiempo transcurrido desde el lap anterior (o el inicio)."""
+            now = time.perf_counter()
+            self.spans[name] = self.spans.get(name, 0.0) + (now - self._last)
+            self._last = now
+
+        def finish(self):
+            self.sample_children()
+            io_end = self._io(psutil.Process())
+            read_b, write_b = (
+                (io_end[0] - self._io_start[0], io_end[1] - self._io_start[1])
+                if io_end and self._io_start else (0, 0)
+            )
+            return {
+                "task_id":        self.task_id,
+                "duration_s":     time.perf_counter() - self._start,
+                "spans":          self.spans,
+                "rows_in":        self.rows_in,
+                "rows_out":       self.rows_out,
+                # ru_maxrss viene en KB en Linux
+                "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                "read_bytes":     read_b,
+                "write_bytes":    write_b,
+                # Pool de hijos: la suma de picos es una cota superior del pico conjunto
+                "pool_processes":      len(self._pool),
+                "pool_peak_rss_bytes": sum(v[0] for v in self._pool.values()),
+                "pool_read_bytes":     sum(v[1] for v in self._pool.values()),
+                "pool_write_bytes":    sum(v[2] for v in self._pool.values()),
+            }
+
+    _current_profile = None
+
+    def _profile() -> TaskProfile:
+        return _current_profile
+
+    def _profile_metrics(p):
+        """Aplana un perfil a {nombre_métrica: valor} con prefijo pipeline.<task>."""
+        prefix = f"pipeline.{p['task_id']}"
+        metrics = {
+            f"{prefix}.duration_s":     p["duration_s"],
+            f"{prefix}.rows_in":        p["rows_in"],
+            f"{prefix}.rows_out":       p["rows_out"],
+            f"{prefix}.peak_rss_bytes": p["peak_rss_bytes"],
+            f"{prefix}.read_bytes":     p["read_bytes"],
+            f"{prefix}.write_bytes":    p["write_bytes"],
+        }
+        if p.get("pool_processes"):
+            for key in ["pool_processes", "pool_peak_rss_bytes", "pool_read_bytes", "pool_write_bytes"]:
+                metrics[f"{prefix}.{key}"] = p[key]
+        for span, secs in p["spans"].items():
+            metrics[f"{prefix}.span.{span}_s"] = secs
+        return metrics
+
+    def _log_profiles_to_mlflow(client: MlflowClient, run_id, profiles):
+        ts = int(time.time() * 1000)
+        metrics = [
+            Metric(k, float(v), ts, 0)
+            for p in profiles if p
+            for k, v in _profile_metrics(p).items()
+        ]
+        for i in range(0, len(metrics), 1000):
+            client.log_batch(run_id, metrics=metrics[i:i + 1000])
+
+    def _push_profile(p, status):
+        gateway = os.getenv("AIRFLOW_VAR_PUSHGATEWAY_URL")
+        if not gateway:
+            return
+        registry = CollectorRegistry()
+        labels   = ["task", "status"]
+        values   = [p["task_id"], status]
+        for name, doc, key in [
+            ("pipeline_task_duration_seconds",  "Duración total de la tarea", "duration_s"),
+            ("pipeline_task_rows_in",           "Filas de entrada",           "rows_in"),
+            ("pipeline_task_rows_out",          "Filas de salida",            "rows_out"),
+            ("pipeline_task_peak_rss_bytes",    "Pico de RSS del proceso",    "peak_rss_bytes"),
+            ("pipeline_task_read_bytes",        "Bytes leídos (disco+red)",   "read_bytes"),
+            ("pipeline_task_write_bytes",       "Bytes escritos (disco+red)", "write_bytes"),
+            ("pipeline_pool_processes",         "Procesos hijos (pool)",      "pool_processes"),
+            ("pipeline_pool_peak_rss_bytes",    "Suma de picos de RSS del pool",  "pool_peak_rss_bytes"),
+            ("pipeline_pool_read_bytes",        "Bytes leídos por el pool",   "pool_read_bytes"),
+            ("pipeline_pool_write_bytes",       "Bytes escritos por el pool", "pool_write_bytes"),
+        ]:
+            Gauge(name, doc, labels, registry=registry).labels(*values).set(p[key])
+        spans = Gauge(
+            "pipeline_span_duration_seconds", "Duración de cada tramo de la tarea",
+            labels + ["span"], registry=registry,
+        )
+        for span, secs in p["spans"].items():
+            spans.labels(*values, span).set(secs)
+        Gauge(
+            "pipeline_task_last_run_timestamp_seconds", "Fin de la última ejecución",
+            labels, registry=registry,
+        ).labels(*values).set_to_current_time()
+        push_to_gateway(gateway, job=PIPELINE_JOB, grouping_key={"task": p["task_id"]}, registry=registry)
+
+    def _traced(task_id, fn):
+        """Envuelve un python_callable para perfilarlo (ver bloque de arriba)."""
+        @functools.wraps(fn)
+        def wrapper(**context):
+            global _current_profile
+            _current_profile = TaskProfile(task_id)
+            status = "failed"
+            try:
+                result = fn(**context)
+                status = "success"
+                return result
+            finally:
+                p = _current_profile.finish()
+                logging.info(f"{task_id} → perfil: {p}")
+                try:
+                    context["ti"].xcom_push(key="profile", value=p)
+                    _push_profile(p, status)
+                    if _current_profile.mlflow_run_id:
+                        client = MlflowClient(tracking_uri=os.getenv("AIRFLOW_VAR_MLFLOW_TRACKING_URI"))
+                        _log_profiles_to_mlflow(client, _current_profile.mlflow_run_id, [p])
+                except Exception as e:
+                    logging.warning(f"{task_id} → no se pudo exportar el perfil: {e}")
+        return wrapper
+
+    # ──────────────────────────────────────────────────────────────────────────────
+    # Plan de tipos para realtor_raw y sus splits. Se aplica al extraer, al leer
+    # en split_data/preprocess_data y en la API de inferencia, de forma que:
+    #   - en MySQL: FLOAT/INT/VARCHAR/DATE en lugar de DOUBLE/TEXT;
+    #   - en pandas: category/float32/Int32 en lugar de float64/object.
+    # price se mantiene en float64 por ser el objetivo del modelo.
+    # ──────────────────────────────────────────────────────────────────────────────
+    RAW_DTYPES = {
+        "brokered_by": "Int32",
+        "status":      "category",
+        "price":       "float64",
+        "bed":         "float32",
+        "bath":        "float32",
+        "acre_lot":    "float32",
+        "street":      "Int32",
+        "city":        "category",
+        "state":       "category",
+        "zip_code":    "Int32",
+        "house_size":  "float32",
+    }
+    RAW_DATE_COLS = ["prev_sold_date"]
+    INT32_MIN, INT32_MAX = -2**31, 2**31 - 1
+
+    RAW_SQL_TYPES = {
+        "brokered_by":    mysql.INTEGER(),
+        "status":         mysql.VARCHAR(32),
+        "price":          mysql.DOUBLE(),
+        "bed":            mysql.FLOAT(),
+        "bath":           mysql.FLOAT(),
+        "acre_lot":       mysql.FLOAT(),
+        "street":         mysql.INTEGER(),
+        "city":           mysql.VARCHAR(128),
+        "state":          mysql.VARCHAR(64),
+        "zip_code":       mysql.INTEGER(),
+        "house_size":     mysql.FLOAT(),
+        "prev_sold_date": mysql.DATE(),
+        "fetched_at":     mysql.DATETIME(),
+    }
+
+    def _apply_raw_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+        """Castea in-place las columnas presentes según RAW_DTYPES/RAW_DATE_COLS."""
+        for col, dtype in RAW_DTYPES.items():
+            if col not in df.columns:
+                continue
+            if dtype == "Int32":
+                # Fuera del rango de int32 (o inf) → <NA> en vez de fallar el cast
+                values  = pd.to_numeric(df[col], errors="coerce").round()
+                df[col] = values.where(values.between(INT32_MIN, INT32_MAX)).astype(dtype)
+            elif dtype == "category":
+                df[col] = df[col].astype(dtype)
+            else:
+                df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+        for col in RAW_DATE_COLS:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], errors="coerce")
+        return df
+
+    def _same_sql_type(current, planned):
+        return (
+            type(current).__name__ == type(planned).__name__
+            and getattr(current, "length", None) == getattr(planned, "length", None)
+        )
+
+    RAW_MIGRATION_CHUNK = 50_000
+
+    def _migrate_raw_schema(engine, table="realtor_raw"):
+        """
+        Migración única: lleva una tabla creada antes del plan de tipos
+        (DOUBLE/TEXT) a RAW_SQL_TYPES. En lugar de un ALTER in-place (que en
+        modo estricto falla con fechas como 2020-02-30 o 0000-00-00), copia la
+        tabla por chunks a `<table>__typed` limpiando cada chunk con
+        _apply_raw_dtypes (mismas reglas que el resto del DAG) y luego la
+        intercambia con un RENAME atómico. No hace nada si la tabla no existe o
+        ya tiene los tipos del plan. Filas que la API inserte durante la copia
+        no se trasladan: conviene que coincida con una ventana sin tráfico.
+        """
+        insp = inspect(engine)
+        if not insp.has_table(table):
+            return
+        current = {c["name"]: c["type"] for c in insp.get_columns(table)}
+        pending = [
+            col for col, planned in RAW_SQL_TYPES.items()
+            if col in current and not _same_sql_type(current[col], planned)
+        ]
+        if not pending:
+            return
+
+        typed, old = f"{table}__typed", f"{table}__old"
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS `{typed}`"))
+            conn.execute(text(f"DROP TABLE IF EXISTS `{old}`"))
+
+        def _clean(df):
+            df = _apply_raw_dtypes(df)
+            # VARCHAR más cortos que el TEXT original: truncar lo que no cabe
+            for col, planned in RAW_SQL_TYPES.items():
+                if col in df.columns and isinstance(planned, mysql.VARCHAR):
+                    df[col] = df[col].astype("string").str.slice(0, planned.length).astype("category")
+            return df
+
+        copied = 0
+        with engine.connect().execution_options(stream_results=True) as src:
+            for chunk in pd.read_sql_table(table, src, chunksize=RAW_MIGRATION_CHUNK):
+                _clean(chunk).to_sql(typed, con=engine, if_exists="append", index=False, dtype=RAW_SQL_TYPES)
+                copied += len(chunk)
+        if copied == 0:
+            # Tabla vacía: crear sólo el esquema tipado
+            _clean(pd.DataFrame({c: pd.Series(dtype="object") for c in current})).to_sql(
+                typed, con=engine, if_exists="append", index=False, dtype=RAW_SQL_TYPES
+            )
+
+        with engine.begin() as conn:
+            conn.execute(text(f"RENAME TABLE `{table}` TO `{old}`, `{typed}` TO `{table}`"))
+            conn.execute(text(f"DROP TABLE `{old}`"))
+        logging.info(f"_migrate_raw_schema → {table}: {copied} filas migradas, columnas {pending}")
+
+    def _downcast_features(df: pd.DataFrame, target: str = "price") -> pd.DataFrame:
+        """MySQL devuelve FLOAT como float64: lo bajamos a float32 (excepto el objetivo)."""
+        for col in df.columns:
+            if col != target and df[col].dtype == "float64":
+                df[col] = df[col].astype("float32")
+        return df
+
+    def _log_memory(tag, before, df):
+        after = df.memory_usage(deep=True).sum()
+        logging.info(
+            f"{tag} → memoria DataFrame: {before / 1e6:.1f} MB → {after / 1e6:.1f} MB "
+            f"({100 * (1 - after / max(before, 1)):.0f}% menos)"
+        )
+
     def extract_data(**context):
         """
         Llama a /data?group_number=7&day=Tuesday.
@@ -50,9 +369,14 @@ with DAG(
 
         finished = False
         new_records = 0
+        prof = _profile()
+
+        _migrate_raw_schema(engine)
+        prof.lap("mysql_migrate")
 
         try:
             resp = requests.get(url, params=params)
+            prof.lap("http_get")
             logging.info(f"extract_data → HTTP {resp.status_code} response.text:\n{resp.text}")
             resp.raise_for_status()
 
@@ -68,13 +392,19 @@ with DAG(
                 rows = []
 
             logging.info(f"extract_data → rows extraídas (len): {len(rows)}")
+            prof.rows_in = len(rows)
+            prof.lap("parse")
 
             # 2) Insertar sólo si llega algo
             if rows:
-                df = pd.DataFrame(rows)
+                df = _apply_raw_dtypes(pd.DataFrame(rows))
                 df["fetched_at"] = datetime.datetime.utcnow()
-                df.to_sql("realtor_raw", con=engine, if_exists="append", index=False)
+                prof.lap("transform")
+                df.to_sql("realtor_raw", con=engine, if_exists="append", index=False,
+                          dtype=RAW_SQL_TYPES)
                 new_records = len(rows)
+                prof.rows_out = new_records
+                prof.lap("mysql_write")
                 logging.info(f"extract_data → insertadas {new_records} filas en realtor_raw")
             else:
                 logging.info("extract_data → no hay filas nuevas (rows vacío), finished sigue False")
@@ -102,7 +432,7 @@ with DAG(
 
     extract_task = PythonOperator(
         task_id="extract_data",
-        python_callable=extract_data,
+        python_callable=_traced("extract_data", extract_data),
         provide_context=True,
     )
 
@@ -112,7 +442,7 @@ with DAG(
 
     branch_exhaust = BranchPythonOperator(
         task_id="branch_on_exhaustion",
-        python_callable=branch_on_exhaustion,
+        python_callable=_traced("branch_on_exhaustion", branch_on_exhaustion),
         provide_context=True,
     )
 
@@ -127,6 +457,7 @@ with DAG(
         resp = requests.get(url, params=params)
         resp.raise_for_status()
         logging.info("reset_data → restart_data_generation OK")
+        _profile().lap("http_restart")
 
         # 2) Engines y inspectors
         RAW_URI = os.getenv("AIRFLOW_CONN_MYSQL_DEFAULT")
@@ -149,6 +480,9 @@ with DAG(
                 else:
                     logging.info(f"reset_data → tabla RawData.{table} NO existe, omitiendo")
 
+        # Con la tabla vacía la migración de tipos es inmediata
+        _migrate_raw_schema(engine_raw)
+
         with engine_clean.begin() as conn:
             for table in tablas_clean:
                 if insp_clean.has_table(table):
@@ -156,13 +490,118 @@ with DAG(
                     logging.info(f"reset_data → tabla CleanData.{table} truncada")
                 else:
                     logging.info(f"reset_data → tabla CleanData.{table} NO existe, omitiendo")
+        _profile().lap("mysql_truncate")
 
     reset_task = PythonOperator(
         task_id="reset_data",
-        python_callable=reset_data,
+        python_callable=_traced("reset_data", reset_data),
     )
 
 
+    # ──────────────────────────────────────────────────────────────────────────────
+    # ──────────────────────────────────────────────────────────────────────────────
+    # Bitácora de decisiones: una fila por ejecución en RawData.train_decisions
+    # (append-only, indexada por fecha). Los runs de MLflow quedan sólo para
+    # los entrenamientos reales. reset_data NO trunca esta tabla.
+    # Al crear la tabla se migran una única vez los runs «decision» históricos
+    # de Realtor_Price_Experiment y, ya insertados, se borran (soft-delete) del
+    # experimento para que no sigan pesando en search_runs.
+    # ──────────────────────────────────────────────────────────────────────────────
+    DECISIONS_TABLE = "train_decisions"
+
+    _INSERT_DECISION = text(f"""
+        INSERT INTO `{DECISIONS_TABLE}`
+            (execution_date, dag_run_id, decision, reason, new_records, logged_at)
+        VALUES
+            (:execution_date, :dag_run_id, :decision, :reason, :new_records, :logged_at)
+    """)
+
+    def _legacy_decision_rows(client: MlflowClient):
+        """
+        Lee los runs «decision» de MLflow (paginando) y devuelve
+        (filas para train_decisions, run_ids migrados).
+        """
+        exp = client.get_experiment_by_name("Realtor_Price_Experiment")
+        if exp is None:
+            return [], []
+
+        rows, run_ids, token = [], [], None
+        while True:
+            page = client.search_runs(
+                experiment_ids=[exp.experiment_id],
+                filter_string="tags.mlflow.runName = 'decision'",
+                max_results=1000,
+                page_token=token,
+            )
+            for r in page:
+                tags = r.data.tags
+                if "decision" not in tags or "execution_date" not in tags:
+                    continue
+                execution_date = pd.Timestamp(tags["execution_date"])
+                if execution_date.tzinfo is not None:
+                    execution_date = execution_date.tz_convert("UTC").tz_localize(None)
+                rows.append({
+                    "execution_date": execution_date.to_pydatetime(),
+                    "dag_run_id":     tags.get("dag_run_id", ""),
+                    "decision":       tags["decision"],
+                    "reason":         tags.get("reason", "")[:1024],
+                    "new_records":    int(r.data.metrics.get("new_records", 0)),
+                    "logged_at":      datetime.datetime.utcfromtimestamp(r.info.start_time / 1000),
+                })
+                run_ids.append(r.info.run_id)
+            token = page.token
+            if not token:
+                return rows, run_ids
+
+    def _ensure_decisions_table(engine):
+        if inspect(engine).has_table(DECISIONS_TABLE):
+            return
+        # Primero MLflow: si falla, la tabla no se crea y el próximo intento repite la migración
+        client = MlflowClient(tracking_uri=os.getenv("AIRFLOW_VAR_MLFLOW_TRACKING_URI"))
+        legacy, run_ids = _legacy_decision_rows(client)
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS `{DECISIONS_TABLE}` (
+                    id             BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    execution_date DATETIME      NOT NULL,
+                    dag_run_id     VARCHAR(250)  NOT NULL,
+                    decision       VARCHAR(32)   NOT NULL,
+                    reason         VARCHAR(1024) NOT NULL,
+                    new_records    INT           NOT NULL,
+                    logged_at      DATETIME      NOT NULL,
+                    KEY idx_execution_date (execution_date)
+                )
+            """))
+            if legacy:
+                conn.execute(_INSERT_DECISION, legacy)
+        logging.info(f"decisions → tabla {DECISIONS_TABLE} creada; {len(legacy)} decisiones migradas desde MLflow")
+
+        # Con las filas ya confirmadas en MySQL, se retiran los runs del experimento
+        deleted = 0
+        for run_id in run_ids:
+            try:
+                client.delete_run(run_id)
+                deleted += 1
+            except Exception as e:
+                logging.warning(f"decisions → no se pudo borrar el run {run_id}: {e}")
+        logging.info(f"decisions → {deleted}/{len(run_ids)} runs «decision» borrados de MLflow")
+
+    def _log_decision(engine, context, new_records, decision, reason):
+        _ensure_decisions_table(engine)
+        execution_date = context["execution_date"].astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        with engine.begin() as conn:
+            conn.execute(
+                _INSERT_DECISION,
+                {
+                    "execution_date": execution_date,
+                    "dag_run_id":     context["dag_run"].run_id,
+                    "decision":       decision,
+                    "reason":         reason[:1024],
+                    "new_records":    int(new_records),
+                    "logged_at":      datetime.datetime.utcnow(),
+                },
+            )
+
     def decide_train(**context):
         """
         BranchPythonOperator para decidir si entrenar:
@@ -171,30 +610,21 @@ with DAG(
         - new_records > 10000         → split_data
         - en otros casos           → end_no_train
 
-        Además registra en MLflow:
-        - métrica new_records
-        - tags: decision, reason, dag_run_id, execution_date
+        Además registra la decisión como una fila en RawData.train_decisions:
+        - new_records, decision, reason, dag_run_id, execution_date
         """
-        # 0) Configurar MLflow
-        mlflow.set_tracking_uri(os.getenv("AIRFLOW_VAR_MLFLOW_TRACKING_URI"))
-        mlflow.set_experiment("Realtor_Price_Experiment")
-
         ti = context["ti"]
-        dag_run = context["dag_run"]
         new_records = ti.xcom_pull(key="new_records", task_ids="extract_data") or 0
+        engine = create_engine(os.getenv("AIRFLOW_CONN_MYSQL_DEFAULT"))
+        prof = _profile()
 
         # Early exit sin datos nuevos
         if new_records == 0:
-            with mlflow.start_run(run_name="decision"):
-                mlflow.log_metric("new_records", 0)
-                mlflow.set_tag("decision", "end_no_train")
-                mlflow.set_tag("reason", "0 new records")
-                mlflow.set_tag("dag_run_id", dag_run.run_id)
-                mlflow.set_tag("execution_date", context["execution_date"].isoformat())
+            _log_decision(engine, context, 0, "end_no_train", "0 new records")
+            prof.lap("mysql_log_decision")
             return "end_no_train"
 
         # 1) Leer los últimos new_records
-        engine = create_engine(os.getenv("AIRFLOW_CONN_MYSQL_DEFAULT"))
         df = pd.read_sql(
             text("""
                 SELECT *
@@ -205,6 +635,8 @@ with DAG(
             con=engine,
             params={"n": new_records},
         )
+        prof.rows_in = len(df)
+        prof.lap("mysql_read")
 
         # 2) Validaciones sólo sobre las columnas que usaremos después
         features = ["status", "bed", "bath", "acre_lot", "house_size", "prev_sold_date", "price"]
@@ -242,21 +674,17 @@ with DAG(
            #     except Exception:
            #         invalid.append("prev_sold_date no parseable")
 
-        # 3) Registrar en MLflow y decidir branch
-        with mlflow.start_run(run_name="decision"):
-            mlflow.log_metric("new_records", new_records)
-            mlflow.set_tag("dag_run_id", dag_run.run_id)
-            mlflow.set_tag("execution_date", context["execution_date"].isoformat())
-
-            if invalid:
-                branch, reason = "end_no_train", " & ".join(invalid)
-            elif new_records > 10000:
-                branch, reason = "split_data", f"{new_records} nuevos > 10000"
-            else:
-                branch, reason = "end_no_train", f"{new_records} nuevos ≤ 10000"
+        # 3) Decidir branch y registrar la decisión
+        if invalid:
+            branch, reason = "end_no_train", " & ".join(invalid)
+        elif new_records > 10000:
+            branch, reason = "split_data", f"{new_records} nuevos > 10000"
+        else:
+            branch, reason = "end_no_train", f"{new_records} nuevos ≤ 10000"
+        prof.lap("validate")
 
-            mlflow.set_tag("decision", branch)
-            mlflow.set_tag("reason", reason)
+        _log_decision(engine, context, new_records, branch, reason)
+        prof.lap("mysql_log_decision")
 
         logging.info(f"decide_train → voy a rama «{branch}» porque new_records={new_records}, reason={reason}")
 
@@ -264,7 +692,7 @@ with DAG(
 
     decide_task = BranchPythonOperator(
         task_id="decide_to_train",
-        python_callable=decide_train,
+        python_callable=_traced("decide_to_train", decide_train),
         provide_context=True,
     )
 
@@ -273,13 +701,19 @@ with DAG(
     # 1) split_data: usa TODO realtor_raw para repartir 60/20/20 y sobreescribe
     #    las tablas train, validation y test en la misma BD de RawData.
     # ──────────────────────────────────────────────────────────────────────────────
-    def split_data():
+    def split_data(**context):
         RAW_URI = os.getenv("AIRFLOW_CONN_MYSQL_DEFAULT")
         engine  = create_engine(RAW_URI)
+        prof    = _profile()
 
         # 1.1) Cargo TODO el histórico
         df = pd.read_sql_table("realtor_raw", con=engine)
+        prof.lap("mysql_read")
+        mem_before = df.memory_usage(deep=True).sum()
+        df = _apply_raw_dtypes(df)
+        _log_memory("split_data", mem_before, df)
         n  = len(df)
+        prof.rows_in = n
         logging.info(f"split_data → {n} registros totales en realtor_raw")
 
         if n == 0:
@@ -293,12 +727,15 @@ with DAG(
         train_df = df.iloc[:i1]
         val_df   = df.iloc[i1:i2]
         test_df  = df.iloc[i2:]
+        prof.lap("transform")
 
         # 1.3) Sobrescribo los splits en RawData
         with engine.begin() as conn:
-            train_df.to_sql( "train",      conn, if_exists="replace", index=False)
-            val_df.to_sql(   "validation", conn, if_exists="replace", index=False)
-            test_df.to_sql(  "test",       conn, if_exists="replace", index=False)
+            train_df.to_sql( "train",      conn, if_exists="replace", index=False, dtype=RAW_SQL_TYPES)
+            val_df.to_sql(   "validation", conn, if_exists="replace", index=False, dtype=RAW_SQL_TYPES)
+            test_df.to_sql(  "test",       conn, if_exists="replace", index=False, dtype=RAW_SQL_TYPES)
+        prof.rows_out = len(train_df) + len(val_df) + len(test_df)
+        prof.lap("mysql_write")
 
         logging.info(
             f"split_data → splits escritos: "
@@ -307,7 +744,7 @@ with DAG(
 
     split_task = PythonOperator(
         task_id="split_data",
-        python_callable=split_data,
+        python_callable=_traced("split_data", split_data),
     )
 
 
@@ -315,11 +752,12 @@ with DAG(
     # 2) preprocess_data: lee los splits recién recreados en RawData,
     #    aplica tu función _prep, y sobrescribe los splits en CleanData.
     # ──────────────────────────────────────────────────────────────────────────────
-    def preprocess_data():
+    def preprocess_data(**context):
         RAW_URI   = os.getenv("AIRFLOW_CONN_MYSQL_DEFAULT")
         CLEAN_URI = os.getenv("AIRFLOW_CONN_MYSQL_CLEAN")
         engine_raw   = create_engine(RAW_URI)
         engine_clean = create_engine(CLEAN_URI)
+        prof = _profile()
 
         def _prep(df: pd.DataFrame) -> pd.DataFrame:
             # 1) Rellenar numéricos
@@ -336,11 +774,11 @@ with DAG(
                 (now - df["prev_sold_date"])
                 .dt.days
                 .fillna(-1)
-                .astype(int)
+                .astype("int32")
             )
 
             # 3) One-hot de status
-            df = pd.get_dummies(df, columns=["status"], drop_first=True)
+            df = pd.get_dummies(df, columns=["status"], drop_first=True, dtype="uint8")
 
             # 4) Eliminar columnas de alta cardinalidad
             drop_cols = [
@@ -364,10 +802,16 @@ with DAG(
         for split in ["train","validation","test"]:
             # 2.1) Leer el split crudo
             df_raw = pd.read_sql_table(split, con=engine_raw)
+            prof.rows_in += len(df_raw)
+            prof.lap(f"{split}.mysql_read")
+            mem_before = df_raw.memory_usage(deep=True).sum()
+            df_raw = _apply_raw_dtypes(df_raw)
+            _log_memory(f"preprocess_data → {split}", mem_before, df_raw)
             logging.info(f"preprocess_data → {split}: {len(df_raw)} filas crudas")
 
             # 2.2) Preprocesar
             df_clean = _prep(df_raw)
+            prof.lap(f"{split}.transform")
             logging.info(f"preprocess_data → {split}: {len(df_clean)} filas limpias")
 
             # 2.3) Sobrescribir el split limpio
@@ -378,29 +822,221 @@ with DAG(
                     if_exists="replace",
                     index=False
                 )
+            prof.rows_out += len(df_clean)
+            prof.lap(f"{split}.mysql_write")
             logging.info(f"preprocess_data → {split}_clean actualizado con {len(df_clean)} filas")
 
     preprocess_task = PythonOperator(
         task_id="preprocess_data",
-        python_callable=preprocess_data,
+        python_callable=_traced("preprocess_data", preprocess_data),
     )
 
 
 
+    # ──────────────────────────────────────────────────────────────────────────────
+    # Búsqueda de modelo: varias familias y sus grillas evaluadas en paralelo
+    # (pool de procesos loky) con una poda temprana sobre una submuestra.
+    #   - Ronda 1: todos los candidatos entrenan/validan sobre SEARCH_SUBSAMPLE.
+    #   - Poda: sólo sobreviven los que quedan a ≤ SEARCH_PRUNE_TOLERANCE del
+    #     mejor, y como mucho un tercio del total.
+    #   - Ronda 2: los sobrevivientes entrenan en train completo y validan en val.
+    # El presupuesto de CPU se fija con AIRFLOW_VAR_SEARCH_N_JOBS.
+    # ──────────────────────────────────────────────────────────────────────────────
+    SEARCH_SPACE = {
+        "ridge":      [{"alpha": a} for a in [0.01, 0.1, 1.0, 10.0, 100.0]],
+        "lasso":      [{"alpha": a, "max_iter": 5000} for a in [0.1, 1.0, 10.0, 100.0]],
+        "elasticnet": [
+            {"alpha": a, "l1_ratio": r, "max_iter": 5000}
+            for a in [0.1, 1.0, 10.0] for r in [0.2, 0.5, 0.8]
+        ],
+        "hist_gbr":   [
+            {"learning_rate": lr, "max_leaf_nodes": n, "max_iter": 200}
+            for lr in [0.05, 0.1] for n in [15, 31]
+        ],
+    }
+    SEARCH_ESTIMATORS = {
+        "ridge":      Ridge,
+        "lasso":      Lasso,
+        "elasticnet": ElasticNet,
+        "hist_gbr":   HistGradientBoostingRegressor,
+    }
+    SEARCH_SUBSAMPLE       = 0.2
+    SEARCH_MIN_ROWS        = 2000
+    SEARCH_PRUNE_TOLERANCE = 0.10
+
+    def _search_n_jobs():
+        default = max(1, min(4, (os.cpu_count() or 1) - 1))
+        return int(os.getenv("AIRFLOW_VAR_SEARCH_N_JOBS", default))
+
+    def _trial_name(family, params):
+        return family + "".join(f"_{k}_{v}" for k, v in params.items() if k != "max_iter")
+
+    # Airflow importa este archivo con un nombre de módulo interno que los
+    # procesos del pool no pueden importar: serializamos sus funciones por valor.
+    cloudpickle.register_pickle_by_value(sys.modules[__name__])
+
+    def _fit_eval(family, params, X_tr, y_tr, X_v, y_v):
+        model = SEARCH_ESTIMATORS[family](**params).fit(X_tr, y_tr)
+        return float(np.sqrt(mean_squared_error(y_v, model.predict(X_v))))
+
+    def _run_trials(candidates, X_tr, y_tr, X_v, y_v, n_jobs):
+        with parallel_backend("loky", inner_max_num_threads=1):
+            return Parallel(n_jobs=n_jobs)(
+                delayed(_fit_eval)(family, params, X_tr, y_tr, X_v, y_v)
+                for family, params in candidates
+            )
+
+    def _subsample(X, y, rng):
+        n = max(min(len(X), SEARCH_MIN_ROWS), int(SEARCH_SUBSAMPLE * len(X)))
+        idx = rng.choice(len(X), size=n, replace=False)
+        return X[idx], y[idx]
+
+    def search_models(X_train, y_train, X_val, y_val):
+        """
+        Ejecuta la búsqueda en dos rondas y devuelve
+        (best_family, best_params, best_val_rmse, trials), donde trials es una
+        lista de dicts {name, family, params, sub_rmse, val_rmse, pruned}.
+        """
+        n_jobs = _search_n_jobs()
+        rng    = np.random.default_rng(42)
+        candidates = [(f, p) for f, grid in SEARCH_SPACE.items() for p in grid]
+
+        # Ronda 1: submuestra
+        X_tr_s, y_tr_s = _subsample(X_train, y_train, rng)
+        X_v_s,  y_v_s  = _subsample(X_val,   y_val,   rng)
+        sub_rmses = _run_trials(candidates, X_tr_s, y_tr_s, X_v_s, y_v_s, n_jobs)
+
+        # Poda (los puntajes NaN/inf, p.ej. un ajuste que diverge, quedan fuera)
+        finite = [i for i in range(len(candidates)) if math.isfinite(sub_rmses[i])]
+        if not finite:
+            raise ValueError("search_models → ningún candidato obtuvo un RMSE finito en la submuestra")
+        threshold = min(sub_rmses[i] for i in finite) * (1 + SEARCH_PRUNE_TOLERANCE)
+        ranked    = sorted(finite, key=lambda i: sub_rmses[i])
+        keep      = [i for i in ranked[:math.ceil(len(candidates) / 3)] if sub_rmses[i] <= threshold]
+
+        # Ronda 2: datos completos
+        full_rmses = _run_trials([candidates[i] for i in keep], X_train, y_train, X_val, y_val, n_jobs)
+        val_rmses  = {i: r for i, r in zip(keep, full_rmses) if math.isfinite(r)}
+        if not val_rmses:
+            raise ValueError("search_models → ningún candidato obtuvo un RMSE finito en validación")
+
+        trials = [
+            {
+                "name":     _trial_name(family, params),
+                "family":   family,
+                "params":   params,
+                "sub_rmse": sub_rmses[i],
+                "val_rmse": val_rmses.get(i),
+                "pruned":   i not in val_rmses,
+            }
+            for i, (family, params) in enumerate(candidates)
+        ]
+        best_i = min(val_rmses, key=val_rmses.get)
+        logging.info(
+            f"search_models → n_jobs={n_jobs} candidatos={len(candidates)} "
+            f"sobrevivientes={len(keep)} mejor={trials[best_i]['name']} "
+            f"val_rmse={val_rmses[best_i]:.2f}"
+        )
+        return candidates[best_i][0], candidates[best_i][1], val_rmses[best_i], trials
+
+    def _log_trials(client: MlflowClient, run_id, trials):
+        """Envía todas las métricas de la búsqueda en lotes (log_batch) en vez de una llamada por trial."""
+        ts = int(time.time() * 1000)
+        metrics = [Metric(f"val_rmse_sub/{t['name']}", t["sub_rmse"], ts, 0) for t in trials]
+        metrics += [
+            Metric(f"val_rmse/{t['name']}", t["val_rmse"], ts, 0)
+            for t in trials if not t["pruned"]
+        ]
+        metrics += [
+            Metric("search_n_trials", len(trials), ts, 0),
+            Metric("search_n_pruned", sum(t["pruned"] for t in trials), ts, 0),
+        ]
+        # log_batch admite hasta 1000 métricas por llamada
+        for i in range(0, len(metrics), 1000):
+            client.log_batch(run_id, metrics=metrics[i:i + 1000])
+
+    # ──────────────────────────────────────────────────────────────────────────────
+    # Registro “champion”: un único tag JSON en el modelo registrado con el
+    # mejor test_rmse, su run_id y su versión. Se escribe en una sola llamada y
+    # se valida en cada lectura contra la versión en Production (que viene en la
+    # misma respuesta de get_registered_model): si difieren, p.ej. porque falló la
+    # escritura tras la transición o alguien cambió stages a mano, se reconstruye.
+    # ──────────────────────────────────────────────────────────────────────────────
+    MODEL_NAME    = "RealtorPriceModel"
+    CHAMPION_TAG  = "champion"
+
+    # ──────────────────────────────────────────────────────────────────────────────
+    # Artefacto compacto (sin pickle) para modelos lineales: coeficientes,
+    # intercepto y orden de features en JSON. La API de inferencia lo carga sin
+    # importar sklearn; si no existe (p.ej. gana hist_gbr) usa el modelo MLflow.
+    # ──────────────────────────────────────────────────────────────────────────────
+    COMPACT_ARTIFACT       = "compact/linear_model.json"
+    COMPACT_FORMAT         = "realtor-linear"
+    COMPACT_FORMAT_VERSION = 1
+
+    def _compact_spec(model, family, features):
+        """Devuelve el dict serializable del modelo, o None si no es lineal."""
+        if not hasattr(model, "coef_"):
+            return None
+        return {
+            "format":         COMPACT_FORMAT,
+            "format_version": COMPACT_FORMAT_VERSION,
+            "model_family":   family,
+            "features":       list(features),
+            "coef":           [float(c) for c in np.ravel(model.coef_)],
+            "intercept":      float(model.intercept_),
+        }
+
+    def _read_champion(client: MlflowClient):
+        """
+        Devuelve {"test_rmse", "run_id", "version"} del champion vigente o None
+        si no hay versión en Production. Si el tag falta o no coincide con la
+        versión en Production, lo reconstruye desde ese run y lo reescribe.
+        """
+        model = client.get_registered_model(MODEL_NAME)
+        prod  = [mv for mv in model.latest_versions or [] if mv.current_stage == "Production"]
+        if not prod:
+            return None
+
+        tags = model.tags or {}
+        if CHAMPION_TAG in tags:
+            champion = json.loads(tags[CHAMPION_TAG])
+            if str(champion.get("version")) == str(prod[0].version):
+                return champion
+            logging.warning(
+                f"champion → tag apunta a v{champion.get('version')} pero Production es "
+                f"v{prod[0].version}; se reconstruye"
+            )
+
+        rmse = client.get_run(prod[0].run_id).data.metrics.get("test_rmse")
+        if rmse is None:
+            return None
+        return _write_champion(client, rmse, prod[0].run_id, prod[0].version)
+
+    def _write_champion(client: MlflowClient, test_rmse, run_id, version):
+        record = {"test_rmse": float(test_rmse), "run_id": run_id, "version": str(version)}
+        client.set_registered_model_tag(MODEL_NAME, CHAMPION_TAG, json.dumps(record))
+        logging.info(f"champion → actualizado: {record}")
+        return record
+
     def train_and_register(**context):
         """
         1) Lee train/validation/test desde CleanData.
         2) Construye all_cols = union de columnas de los tres splits.
-        3) Busca manualmente alpha (Ridge) reindexando columnas para entrenar en validación.
-        4) Reentrena sobre train+validation con el mejor alpha, de nuevo alineando columnas.
+        3) Busca familia de modelo e hiperparámetros en paralelo (search_models), con poda temprana.
+        4) Reentrena sobre train+validation con el mejor candidato, de nuevo alineando columnas.
         5) Evalúa en test (alineando columnas) y obtiene test_rmse.
-        6) Registra en MLflow (val_rmse_alpha_*, best_val_rmse, test_rmse, parámetro best_alpha, modelo).
-        7) Recupera el best test_rmse de corridas previas (excluyendo este run), filtrando en Python.
-        8) Decide si “promover” a Production.
-        9) Vuelve a abrir el run actual y añade tags de orquestación.
-        10) Si corresponde, transiciona la versión recién creada a Production (archivando las anteriores).
+        6) Registra en MLflow (trials en lote, best_val_rmse, test_rmse, parámetros del mejor, modelo
+           y, si es lineal, el artefacto compacto compact/linear_model.json)
+           y registra la versión del modelo obteniendo su número directamente.
+        7) Lee el registro “champion” (tag del modelo registrado) con el mejor test_rmse vigente.
+        8) Decide si “promover” a Production y añade los tags de orquestación en el mismo run.
+        9) Si corresponde, transiciona la versión recién creada a Production (archivando las anteriores)
+           y actualiza el registro champion.
+        Además adjunta al run los perfiles (pipeline.*) de las tareas previas del DAG.
         """
         dag_run = context["dag_run"]
+        prof    = _profile()
 
         # -------------------------------------------------------
         # 1) Leer datos limpios desde CleanData
@@ -408,9 +1044,11 @@ with DAG(
         CLEAN_URI = os.getenv("AIRFLOW_CONN_MYSQL_CLEAN")
         engine = create_engine(CLEAN_URI)
 
-        df_train = pd.read_sql_table("train_clean",      con=engine)
-        df_val   = pd.read_sql_table("validation_clean", con=engine)
-        df_test  = pd.read_sql_table("test_clean",       con=engine)
+        df_train = _downcast_features(pd.read_sql_table("train_clean",      con=engine))
+        df_val   = _downcast_features(pd.read_sql_table("validation_clean", con=engine))
+        df_test  = _downcast_features(pd.read_sql_table("test_clean",       con=engine))
+        prof.rows_in = len(df_train) + len(df_val) + len(df_test)
+        prof.lap("mysql_read")
 
         # Separamos features y target
         X_train_raw, y_train = df_train.drop("price", axis=1), df_train["price"]
@@ -429,14 +1067,7 @@ with DAG(
         mlflow.set_experiment("Realtor_Price_Experiment")
 
         # -------------------------------------------------------
-        # 3) Lista de alphas a probar
-        # -------------------------------------------------------
-        alphas = [0.01, 0.1, 1.0, 10.0, 100.0]
-        best_alpha    = None
-        best_val_rmse = float("inf")
-
-        # -------------------------------------------------------
-        # 4) Construir el conjunto all_cols = unión de columnas de los tres splits
+        # 3) Construir el conjunto all_cols = unión de columnas de los tres splits
         # -------------------------------------------------------
         all_cols = sorted(
             set(X_train_raw.columns)
@@ -444,124 +1075,130 @@ with DAG(
             | set(X_test_raw.columns)
         )
 
-        # -------------------------------------------------------
-        # 5) Primera corrida: búsqueda manual de alpha
-        #    (entrena en train, predice en val; siempre reindexando a all_cols)
-        # -------------------------------------------------------
+        X_train_aligned = X_train_raw.reindex(columns=all_cols, fill_value=0)
+        X_val_aligned   = X_val_raw.reindex(columns=all_cols, fill_value=0)
+
         with mlflow.start_run(run_name=f"train__{dag_run.run_id}") as run:
             current_run_id = run.info.run_id
+            client = MlflowClient(tracking_uri=os.getenv("AIRFLOW_VAR_MLFLOW_TRACKING_URI"))
+
+            # Perfiles de las tareas previas; el de esta tarea lo añade _traced al terminar
+            prof.mlflow_run_id = current_run_id
+            upstream_profiles  = context["ti"].xcom_pull(
+                key="profile",
+                task_ids=["extract_data", "branch_on_exhaustion", "decide_to_train",
+                          "split_data", "preprocess_data"],
+            )
+            _log_profiles_to_mlflow(client, current_run_id, upstream_profiles)
 
-            for α in alphas:
-                # 5.1) Entrenar en train alineado
-                X_train_aligned = X_train_raw.reindex(columns=all_cols, fill_value=0)
-                ridge_tmp = Ridge(alpha=α).fit(X_train_aligned, y_train)
-
-                # 5.2) Predecir en val alineado
-                X_val_aligned = X_val_raw.reindex(columns=all_cols, fill_value=0)
-                rmse_v = np.sqrt(mean_squared_error(y_val, ridge_tmp.predict(X_val_aligned)))
-
-                mlflow.log_metric(f"val_rmse_alpha_{α}", rmse_v)
-
-                if rmse_v < best_val_rmse:
-                    best_val_rmse = rmse_v
-                    best_alpha    = α
+            # -------------------------------------------------------
+            # 4) Búsqueda paralela de familia + hiperparámetros
+            #    (entrena en train, valida en val; arrays numpy para el pool)
+            # -------------------------------------------------------
+            best_family, best_params, best_val_rmse, trials = search_models(
+                X_train_aligned.to_numpy(dtype=np.float32), y_train.to_numpy(),
+                X_val_aligned.to_numpy(dtype=np.float32),   y_val.to_numpy(),
+            )
+            prof.sample_children()
+            _log_trials(client, current_run_id, trials)
+            prof.lap("search")
 
             # -------------------------------------------------------
-            # 6) Reentrenar modelo final con train+val usando best_alpha
+            # 5) Reentrenar modelo final con train+val usando el mejor candidato
             #    (concatenar dataframes y luego alinear a all_cols)
             # -------------------------------------------------------
             df_trval = pd.concat([X_train_raw, X_val_raw], axis=0)
             y_trval  = pd.concat([y_train,      y_val],      axis=0)
 
             X_trval_aligned = df_trval.reindex(columns=all_cols, fill_value=0)
-            final_model     = Ridge(alpha=best_alpha).fit(X_trval_aligned, y_trval)
+            final_model     = SEARCH_ESTIMATORS[best_family](**best_params).fit(X_trval_aligned, y_trval)
+            prof.lap("refit")
 
             # -------------------------------------------------------
-            # 7) Evaluar en test (alineando columnas)
+            # 6) Evaluar en test (alineando columnas)
             # -------------------------------------------------------
             X_test_aligned = X_test_raw.reindex(columns=all_cols, fill_value=0)
             test_rmse      = np.sqrt(mean_squared_error(y_test, final_model.predict(X_test_aligned)))
+            prof.lap("evaluate")
 
             # -------------------------------------------------------
-            # 8) Log de métricas y parámetros en MLflow, y registro del modelo
+            # 7) Log de métricas y parámetros en MLflow, y registro del modelo
             # -------------------------------------------------------
-            mlflow.log_metric("best_val_rmse", best_val_rmse)
-            mlflow.log_metric("test_rmse",     test_rmse)
-            mlflow.log_param( "best_alpha",    best_alpha)
+            ts = int(time.time() * 1000)
+            client.log_batch(
+                current_run_id,
+                metrics=[
+                    Metric("best_val_rmse", best_val_rmse, ts, 0),
+                    Metric("test_rmse",     test_rmse,     ts, 0),
+                ],
+                params=[Param("best_family", best_family)]
+                + [Param(f"best_{k}", str(v)) for k, v in best_params.items()],
+            )
 
             mlflow.sklearn.log_model(
-                sk_model               = final_model,
-                artifact_path          = "model",
-                registered_model_name  = "RealtorPriceModel"
+                sk_model      = final_model,
+                artifact_path = "model",
             )
+            compact = _compact_spec(final_model, best_family, all_cols)
+            if compact is not None:
+                mlflow.log_dict(compact, COMPACT_ARTIFACT)
+                mlflow.set_tag("compact_artifact", COMPACT_ARTIFACT)
+            prof.lap("mlflow_log_model")
+
+            # Registrar explícitamente para conocer la versión sin consultar el registry
+            my_version = mlflow.register_model(
+                model_uri = f"runs:/{current_run_id}/model",
+                name      = MODEL_NAME,
+            ).version
+            prof.lap("mlflow_register")
 
-        # -------------------------------------------------------
-        # 9) Buscar la mejor corrida previa (excluyendo este run),
-        #    ordenada por “test_rmse” y filtrando en Python para evitar IS NOT NULL
-        # -------------------------------------------------------
-        client = MlflowClient(tracking_uri=os.getenv("AIRFLOW_VAR_MLFLOW_TRACKING_URI"))
-        exp    = client.get_experiment_by_name("Realtor_Price_Experiment")
-
-        prior_runs = client.search_runs(
-            experiment_ids=[exp.experiment_id],
-            filter_string=f"attributes.run_id != '{current_run_id}'",
-            order_by=["metrics.test_rmse ASC"],
-            max_results=20
-        )
-        # Filtramos en Python sólo aquellos que tengan la métrica "test_rmse"
-        valid_priors = [r for r in prior_runs if "test_rmse" in r.data.metrics]
-        if valid_priors:
-            prev_best_rmse = valid_priors[0].data.metrics["test_rmse"]
-        else:
-            prev_best_rmse = None
+            # -------------------------------------------------------
+            # 8) Leer el champion vigente (O(1), sin search_runs sobre el experimento)
+            # -------------------------------------------------------
+            champion = _read_champion(client)
+            prev_best_rmse = champion["test_rmse"] if champion else None
 
-        # -------------------------------------------------------
-        # 10) Decidir si promocionar el modelo
-        # -------------------------------------------------------
-        promoted = (prev_best_rmse is None) or (test_rmse < prev_best_rmse)
+            # -------------------------------------------------------
+            # 9) Decidir si promocionar el modelo
+            # -------------------------------------------------------
+            promoted = (prev_best_rmse is None) or (test_rmse < prev_best_rmse)
 
-        # -------------------------------------------------------
-        # 11) Reabrir el run actual para añadir tags de orquestación
-        # -------------------------------------------------------
-        with mlflow.start_run(run_id=current_run_id):
-            mlflow.set_tag("dag_run_id",         dag_run.run_id)
-            mlflow.set_tag("execution_date",     context["execution_date"].isoformat())
-            mlflow.set_tag("previous_best_rmse", str(prev_best_rmse))
-            mlflow.set_tag("current_rmse",       str(test_rmse))
-            mlflow.set_tag("promoted",           "true" if promoted else "false")
+            # -------------------------------------------------------
+            # 10) Tags de orquestación (en el mismo run, sin reabrirlo)
+            # -------------------------------------------------------
+            mlflow.set_tags({
+                "dag_run_id":         dag_run.run_id,
+                "execution_date":     context["execution_date"].isoformat(),
+                "previous_best_rmse": str(prev_best_rmse),
+                "current_rmse":       str(test_rmse),
+                "model_version":      str(my_version),
+                "promoted":           "true" if promoted else "false",
+            })
 
         # -------------------------------------------------------
-        # 12) Si corresponde, transicionar la versión recién creada a Production
-        #     y archivar versiones anteriores
+        # 11) Si corresponde, transicionar la versión recién creada a Production,
+        #     archivar versiones anteriores y actualizar el champion
         # -------------------------------------------------------
         if promoted:
-            versions = client.get_latest_versions("RealtorPriceModel")
-            my_version = None
-            for mv in versions:
-                if mv.run_id == current_run_id:
-                    my_version = mv.version
-                    break
-
-            if my_version is None:
-                raise RuntimeError(f"No se encontró la versión para run_id={current_run_id}")
-
             client.transition_model_version_stage(
-                name                      = "RealtorPriceModel",
+                name                      = MODEL_NAME,
                 version                   = my_version,
                 stage                     = "Production",
                 archive_existing_versions = True
             )
+            _write_champion(client, test_rmse, current_run_id, my_version)
             logging.info(
                 f"train_and_register → Modelo versión {my_version} promovido a Production"
             )
+        prof.lap("mlflow_promote")
 
         # -------------------------------------------------------
-        # 13) Log final en consola
+        # 12) Log final en consola
         # -------------------------------------------------------
         logging.info(
             "train_and_register → "
             f"run_id={current_run_id}  "
-            f"best_alpha={best_alpha}  "
+            f"best={_trial_name(best_family, best_params)}  "
             f"test_rmse={test_rmse:.2f}  "
             f"promoted={promoted}"
         )
@@ -569,7 +1206,7 @@ with DAG(
 
     train_task = PythonOperator(
         task_id="train_and_register",
-        python_callable=train_and_register,
+        python_callable=_traced("train_and_register", train_and_register),
         provide_context=True,
     )
 
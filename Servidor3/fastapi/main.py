@@ -4,13 +4,17 @@ from datetime import datetime
 import pandas as pd
 import numpy as np
 import mlflow
-import mlflow.sklearn
+import mlflow.artifacts
 from mlflow.tracking import MlflowClient
 import os
+import json
+import tempfile
+import threading
 import logging
 
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import mysql
 
 # ───── Prometheus Metrics ─────
 PREDICTIONS = Counter("inference_requests_total", "Total de peticiones de inferencia")
@@ -34,6 +38,116 @@ engine = create_engine(RAW_URI)
 app = FastAPI()
 logging.basicConfig(level=logging.INFO)
 
+# ───── Plan de tipos (mismo que el DAG realtor_price_model) ─────
+RAW_DTYPES = {
+    "brokered_by": "Int32",
+    "status":      "category",
+    "price":       "float64",
+    "bed":         "float32",
+    "bath":        "float32",
+    "acre_lot":    "float32",
+    "street":      "Int32",
+    "city":        "category",
+    "state":       "category",
+    "zip_code":    "Int32",
+    "house_size":  "float32",
+}
+RAW_DATE_COLS = ["prev_sold_date"]
+INT32_MIN, INT32_MAX = -2**31, 2**31 - 1
+
+RAW_SQL_TYPES = {
+    "brokered_by":    mysql.INTEGER(),
+    "status":         mysql.VARCHAR(32),
+    "price":          mysql.DOUBLE(),
+    "bed":            mysql.FLOAT(),
+    "bath":           mysql.FLOAT(),
+    "acre_lot":       mysql.FLOAT(),
+    "street":         mysql.INTEGER(),
+    "city":           mysql.VARCHAR(128),
+    "state":          mysql.VARCHAR(64),
+    "zip_code":       mysql.INTEGER(),
+    "house_size":     mysql.FLOAT(),
+    "prev_sold_date": mysql.DATE(),
+    "fetched_at":     mysql.DATETIME(),
+}
+
+def apply_raw_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    for col, dtype in RAW_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype == "Int32":
+            # Fuera del rango de int32 (o inf) → <NA> en vez de fallar el cast
+            values  = pd.to_numeric(df[col], errors="coerce").round()
+            df[col] = values.where(values.between(INT32_MIN, INT32_MAX)).astype(dtype)
+        elif dtype == "category":
+            df[col] = df[col].astype(dtype)
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+    for col in RAW_DATE_COLS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    return df
+
+# ───── Carga del modelo en producción ─────
+# El DAG registra para modelos lineales un artefacto compacto (JSON sin pickle)
+# y lo anuncia con el tag compact_artifact del run; sólo si falta ese tag se
+# usa el modelo sklearn de MLflow.
+COMPACT_FORMAT         = "realtor-linear"
+COMPACT_FORMAT_VERSION = 1
+
+class CompactLinearModel:
+    def __init__(self, spec: dict):
+        if spec.get("format") != COMPACT_FORMAT or spec.get("format_version") != COMPACT_FORMAT_VERSION:
+            raise ValueError(f"Formato compacto no soportado: {spec.get('format')} v{spec.get('format_version')}")
+        self.features  = spec["features"]
+        self.coef      = np.asarray(spec["coef"], dtype=np.float64)
+        self.intercept = float(spec["intercept"])
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        X = X.reindex(columns=self.features, fill_value=0).to_numpy(dtype=np.float64)
+        return X @ self.coef + self.intercept
+
+_model_cache = {}
+_model_lock  = threading.Lock()
+
+def _load_model(run_id: str, version: str):
+    """
+    Si el run tiene el tag compact_artifact, carga sólo ese artefacto y cualquier
+    fallo (descarga, JSON o format_version) se propaga: nunca se cae a unpickle.
+    El modelo sklearn de MLflow se usa únicamente cuando el tag no existe.
+    """
+    artifact = MlflowClient().get_run(run_id).data.tags.get("compact_artifact")
+    if artifact is None:
+        logging.warning(f"Modelo v{version} sin artefacto compacto; cargando modelo sklearn (pickle)")
+        import mlflow.sklearn
+        return mlflow.sklearn.load_model(f"models:/{MODEL_NAME}/{version}")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = mlflow.artifacts.download_artifacts(
+                run_id=run_id, artifact_path=artifact, dst_path=tmp
+            )
+            with open(path) as f:
+                model = CompactLinearModel(json.load(f))
+    except Exception:
+        logging.exception(f"No se pudo cargar el artefacto compacto {artifact} del modelo v{version}")
+        raise
+    logging.info(f"Modelo v{version} cargado desde {artifact}")
+    return model
+
+def get_production_model():
+    """Devuelve (modelo, versión) en Production, cargándolo sólo cuando cambia la versión."""
+    mv = MlflowClient().get_latest_versions(MODEL_NAME, stages=["Production"])[0]
+    # /predict corre en el threadpool: check-load-store bajo lock y se devuelve
+    # la referencia local, nunca releída del dict compartido
+    with _model_lock:
+        model = _model_cache.get(mv.version)
+        if model is None:
+            model = _load_model(mv.run_id, mv.version)
+            _model_cache.clear()
+            _model_cache[mv.version] = model
+    return model, mv.version
+
 class RawFeatures(BaseModel):
     brokered_by: float
     status: str
@@ -49,16 +163,15 @@ class RawFeatures(BaseModel):
     prev_sold_date: str
 
 def preprocess_and_align(data: dict, model) -> pd.DataFrame:
-    df = pd.DataFrame([data])
-    
+    df = apply_raw_dtypes(pd.DataFrame([data]))
+
     # 1) Rellenar numéricos
     num_cols = ["bed", "bath", "acre_lot", "house_size", "price"]
     df[num_cols] = df[num_cols].ffill().fillna(0)
 
     # 2) Calcular days_since_last_sale
-    df["prev_sold_date"] = pd.to_datetime(df["prev_sold_date"], errors="coerce")
     now = pd.Timestamp.utcnow().replace(tzinfo=None)
-    df["days_since_last_sale"] = (now - df["prev_sold_date"]).dt.days.fillna(-1).astype(int)
+    df["days_since_last_sale"] = (now - df["prev_sold_date"]).dt.days.fillna(-1).astype("int32")
 
     # 3) Generar columnas dummy posibles
     df["status_to_build"] = 1 if data["status"] == "to_build" else 0
@@ -68,6 +181,10 @@ def preprocess_and_align(data: dict, model) -> pd.DataFrame:
     drop_cols = ["brokered_by", "street", "zip_code", "city", "state", "prev_sold_date", "status"]
     df.drop(columns=drop_cols, inplace=True, errors="ignore")
 
+    # El artefacto compacto trae el orden exacto de features
+    if isinstance(model, CompactLinearModel):
+        return df.reindex(columns=model.features, fill_value=0)
+
     # 5) Probar combinaciones posibles
     candidate_sets = [
         ["bed", "bath", "acre_lot", "house_size", "days_since_last_sale", "status_to_build"],
@@ -100,16 +217,13 @@ def predict(raw: RawFeatures):
     logging.info(f"Solicitud de inferencia recibida: {data_dict}")
 
     with LATENCIES.time():
-        model = mlflow.sklearn.load_model(f"models:/{MODEL_NAME}/Production")
+        model, version = get_production_model()
         df_input = preprocess_and_align(data_dict, model)
-        prediction = model.predict(df_input)[0]
+        prediction = float(model.predict(df_input)[0])
         logging.info(f"Predicción generada: {prediction}")
 
-        client = MlflowClient()
-        version = client.get_latest_versions(MODEL_NAME, stages=["Production"])[0].version
-
-        record = {**data_dict, "fetched_at": now_utc}
-        pd.DataFrame([record]).to_sql("realtor_raw", con=engine, if_exists="append", index=False)
+        record = apply_raw_dtypes(pd.DataFrame([{**data_dict, "fetched_at": now_utc}]))
+        record.to_sql("realtor_raw", con=engine, if_exists="append", index=False, dtype=RAW_SQL_TYPES)
 
     return {
         "prediction": prediction,
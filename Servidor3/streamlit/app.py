@@ -3,13 +3,17 @@ import requests
 import mlflow
 from mlflow.tracking import MlflowClient
 import pandas as pd
+import datetime
 import os
+from sqlalchemy import create_engine, text, inspect
 
 # ───── Configuración por entorno ─────
 API_URL = os.getenv("API_URL", "http://fastapi:8000/predict")
 MLFLOW_URI = os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5000")
+RAW_URI = os.getenv("RAW_DATA_DB_URI")
 mlflow.set_tracking_uri(MLFLOW_URI)
 client = MlflowClient()
+engine = create_engine(RAW_URI)
 
 st.title("🏠 Realtor Price Prediction")
 
@@ -44,36 +48,67 @@ if st.button("Predecir"):
 # ─── Historial de decisiones y modelos ───
 st.header("📊 Historial de Decisiones y Modelos")
 
-runs = client.search_runs(
-    experiment_ids=[client.get_experiment_by_name("Realtor_Price_Experiment").experiment_id],
-    order_by=["start_time DESC"],
-    max_results=500
+# Las decisiones viven en RawData.train_decisions (una fila por ejecución del DAG)
+rango = st.date_input(
+    "Rango de fechas de ejecución",
+    value=(datetime.date.today() - datetime.timedelta(days=30), datetime.date.today()),
 )
+if len(rango) != 2:
+    st.stop()
+desde, hasta = rango
 
-decisions, models = [], []
+if not inspect(engine).has_table("train_decisions"):
+    st.warning("Aún no hay decisiones registradas: la tabla train_decisions se crea en la primera ejecución del DAG.")
+    st.stop()
+
+df_dec = pd.read_sql(
+    text("""
+        SELECT dag_run_id AS Dag_Run_ID, decision AS Decision, reason AS `Decision Reason`
+        FROM train_decisions
+        WHERE execution_date >= :desde AND execution_date < :hasta
+        ORDER BY execution_date DESC
+    """),
+    con=engine,
+    params={"desde": desde, "hasta": hasta + datetime.timedelta(days=1)},
+)
+
+# Sólo runs de entrenamiento de las ejecuciones del rango: un entrenamiento
+# empieza después de la execution_date de su DAG run, así que basta con
+# acotar start_time por abajo y filtrar por dag_run_id.
+dag_run_ids = set(df_dec["Dag_Run_ID"])
+desde_ms = int(datetime.datetime.combine(desde, datetime.time.min, tzinfo=datetime.timezone.utc).timestamp() * 1000)
+experiment_id = client.get_experiment_by_name("Realtor_Price_Experiment").experiment_id
+runs, token = [], None
+while dag_run_ids:
+    page = client.search_runs(
+        experiment_ids=[experiment_id],
+        filter_string=f"tags.mlflow.runName LIKE 'train__%' AND attributes.start_time >= {desde_ms}",
+        order_by=["start_time DESC"],
+        max_results=500,
+        page_token=token,
+    )
+    runs.extend(r for r in page if r.data.tags.get("dag_run_id") in dag_run_ids)
+    token = page.token
+    if not token:
+        break
+
+models = []
 for r in runs:
     tags = r.data.tags
-    if tags.get("decision"):
-        decisions.append({
-            "Dag_Run_ID": tags.get("dag_run_id"),
-            "Decision": tags.get("decision"),
-            "Decision Reason": tags.get("reason")
-        })
     if tags.get("current_rmse"):
         models.append({
             "Dag_Run_ID": tags.get("dag_run_id"),
             "Model name": "RealtorPriceModel",
-            "Model Version": next((v.version for v in client.get_latest_versions("RealtorPriceModel") if v.run_id == r.info.run_id), "N/A"),
+            "Model Version": tags.get("model_version", "N/A"),
             "Current Rsme": tags.get("current_rmse"),
             "Promoted": tags.get("promoted"),
             "Previous Rsme": tags.get("previous_best_rmse")
         })
 
-df_dec = pd.DataFrame(decisions)
-df_mod = pd.DataFrame(models)
-if not df_dec.empty and not df_mod.empty:
+df_mod = pd.DataFrame(models, columns=["Dag_Run_ID", "Model name", "Model Version", "Current Rsme", "Promoted", "Previous Rsme"])
+if not df_dec.empty:
     df = pd.merge(df_dec, df_mod, on="Dag_Run_ID", how="left")
     df = df[["Dag_Run_ID", "Decision", "Decision Reason", "Model name", "Model Version", "Current Rsme", "Promoted", "Previous Rsme"]]
     st.dataframe(df)
 else:
-    st.warning("No hay datos suficientes en MLflow para mostrar el historial.")
\ No newline at end of file
+    st.warning("No hay decisiones registradas en el rango seleccionado.")
\ No newline at end of file